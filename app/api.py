@@ -1,28 +1,90 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth import authenticate, logout
 from django.utils import timezone
-from .models import User, Department, Course, LectureHall, Timetable, Attendance
+from .models import (
+    User, Department, Course, LectureHall, Timetable, Attendance, StudentCourseStats,
+    FEEDBACK_MESSAGES, compute_quartile, feedback_for_quartile
+)
 from .serializers import (
     UserSerializer, DepartmentSerializer, CourseSerializer, 
     LectureHallSerializer, TimetableSerializer, AttendanceSerializer,
     AttendanceStatsSerializer
 )
-import geopy.distance
-from datetime import datetime, timedelta
+from datetime import timedelta
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiExample, OpenApiResponse
 from drf_spectacular.types import OpenApiTypes
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 import csv
+import math
 import openpyxl
 from reportlab.pdfgen import canvas
-from io import BytesIO
-from django.db.models import Count, Q
+from django.db.models import (
+    Case, CharField, Count, ExpressionWrapper, F, FloatField, IntegerField, OuterRef, Prefetch, Q,
+    Subquery, Value, When
+)
+from django.db.models.functions import Coalesce, Concat, Trim
 from rest_framework.views import APIView
+from rest_framework.pagination import CursorPagination
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError, transaction
+
+class AttendanceCursorPagination(CursorPagination):
+    # Keyset pages over att_timestamp_desc; no COUNT and no OFFSET scan as the table grows
+    ordering = '-timestamp'
+    page_size = 50
+
+class Echo:
+    """File-like object whose write() hands the value back, for streaming csv.writer rows."""
+    def write(self, value):
+        return value
+
+STATUS_DISPLAY = dict(Attendance.Status.choices)
+
+def export_rows(queryset, chunk_size):
+    """Yield attendance export rows from values_list() tuples, skipping model instantiation."""
+    rows = queryset.values_list(
+        'student__matric_number', 'student__first_name', 'student__last_name', 'timestamp', 'status'
+    ).iterator(chunk_size=chunk_size)
+    for idx, (matric_number, first_name, last_name, timestamp, status_code) in enumerate(rows, start=1):
+        yield [
+            idx,
+            matric_number,
+            f'{first_name} {last_name}'.strip(),
+            timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            STATUS_DISPLAY[status_code]
+        ]
+
+def parse_coordinates(data):
+    """Return (latitude, longitude) as finite, in-range floats, or None if either is missing or invalid."""
+    try:
+        latitude = float(data.get('latitude'))
+        longitude = float(data.get('longitude'))
+    except (TypeError, ValueError):
+        return None
+    if not (math.isfinite(latitude) and math.isfinite(longitude)):
+        return None
+    if abs(latitude) > 90 or abs(longitude) > 180:
+        return None
+    return latitude, longitude
+
+def get_tokens_for_user(user):
+    """Issue a refresh/access JWT pair, signing each token exactly once."""
+    refresh = RefreshToken.for_user(user)
+    return {
+        'refresh': str(refresh),
+        'access': str(refresh.access_token)
+    }
+
+def draw_pdf_column_headers(p, y):
+    p.drawString(100, y, "S/N")
+    p.drawString(150, y, "Matric Number")
+    p.drawString(300, y, "Full Name")
+    p.drawString(450, y, "Timestamp")
+    p.drawString(550, y, "Status")
 
 class AuthViewSet(viewsets.ViewSet):
     permission_classes = [AllowAny]
@@ -75,6 +137,9 @@ class AuthViewSet(viewsets.ViewSet):
                     )
                 ]
             ),
+            400: OpenApiResponse(
+                description='Missing or invalid coordinates'
+            ),
             401: OpenApiResponse(
                 description='Invalid credentials',
                 examples=[
@@ -105,62 +170,48 @@ class AuthViewSet(viewsets.ViewSet):
     def student_login(self, request):
         matric = request.data.get('matric_number')
         password = request.data.get('password')
-        latitude = request.data.get('latitude')
-        longitude = request.data.get('longitude')
+        coordinates = parse_coordinates(request.data)
+        if coordinates is None:
+            return Response({'error': 'Valid latitude and longitude are required'}, status=status.HTTP_400_BAD_REQUEST)
+        latitude, longitude = coordinates
         
         user = authenticate(request, username=matric, password=password)
         
         if user is None or user.user_type != User.UserType.STUDENT:
             return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
         
-        current_time = timezone.now().time()
-        today = timezone.now().weekday()
-        
-        current_timetable = Timetable.objects.filter(
-            day_of_week=today,
-            start_time__lte=current_time,
-            end_time__gte=current_time,
-            course__department=user.department,
-            active=True
-        ).first()
+        now = timezone.now()
+        current_timetable = Timetable.current_for_department(user.department_id, now)
         
         if not current_timetable:
             return Response({'error': 'No active class at this time'}, status=status.HTTP_403_FORBIDDEN)
         
         lecture_hall = current_timetable.lecture_hall
-        hall_coords = (lecture_hall.latitude, lecture_hall.longitude)
-        student_coords = (float(latitude), float(longitude))
-        
-        distance = geopy.distance.distance(hall_coords, student_coords).m
+        distance = lecture_hall.distance_to(latitude, longitude)
         
-        if distance > lecture_hall.radius:
+        # Written so a NaN distance is rejected too
+        if not distance <= lecture_hall.radius:
             return Response({
                 'error': 'You must be in the lecture hall to mark attendance',
                 'distance': distance,
                 'allowed_radius': lecture_hall.radius
             }, status=status.HTTP_403_FORBIDDEN)
         
-        # Update user's last login location
-        user.last_login_location = {
-            'latitude': latitude,
-            'longitude': longitude,
-            'timestamp': timezone.now().isoformat()
-        }
-        user.save()
-        
-        # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
-        access_token = str(refresh.access_token)
+        # Update user's last login time and location
+        User.objects.filter(pk=user.pk).update(
+            last_login=now,
+            last_login_location={
+                'latitude': latitude,
+                'longitude': longitude,
+                'timestamp': now.isoformat()
+            }
+        )
         
-        login(request, user)
         return Response({
             'message': 'Login successful',
             'user': UserSerializer(user).data,
             'current_class': TimetableSerializer(current_timetable).data,
-            'tokens': {
-                'refresh': str(refresh),
-                'access': access_token
-            }
+            'tokens': get_tokens_for_user(user)
         })
     
     @extend_schema(
@@ -196,31 +247,35 @@ class AuthViewSet(viewsets.ViewSet):
         if user is None or user.user_type != User.UserType.LECTURER:
             return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
         
-        refresh = RefreshToken.for_user(user)
-        access_token = str(refresh.access_token)
+        User.objects.filter(pk=user.pk).update(last_login=timezone.now())
         
-        login(request, user)
         return Response({
             'message': 'Login successful',
             'user': UserSerializer(user).data,
-            'tokens': {
-                'refresh': str(refresh),
-                'access': access_token
-            }
+            'tokens': get_tokens_for_user(user)
         })
 
 class AttendanceViewSet(viewsets.ModelViewSet):
-    queryset = Attendance.objects.all()
+    # The serializer nests student, course and timetable; their own relations render as pks
+    queryset = Attendance.objects.select_related('student', 'course').only(
+        'id', 'timestamp', 'latitude', 'longitude', 'status', 'course', 'timetable',
+        'student__id', 'student__matric_number', 'student__first_name', 'student__last_name'
+    )
     serializer_class = AttendanceSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = AttendanceCursorPagination
     
     def get_queryset(self):
         user = self.request.user
+        # Timetables are prefetched rather than joined so they carry the is_active_now annotation
+        queryset = super().get_queryset().prefetch_related(
+            Prefetch('timetable', queryset=Timetable.objects.with_active_flag())
+        )
         if user.user_type == User.UserType.STUDENT:
-            return Attendance.objects.filter(student=user)
+            return queryset.filter(student=user)
         elif user.user_type == User.UserType.LECTURER:
-            return Attendance.objects.filter(course__in=user.courses.all())
-        return Attendance.objects.none()
+            return queryset.filter(course__in=user.courses.all())
+        return queryset.none()
     
     @extend_schema(
         request={
@@ -236,10 +291,27 @@ class AttendanceViewSet(viewsets.ModelViewSet):
         responses={
             201: OpenApiResponse(
                 description='Attendance marked successfully',
-                response=AttendanceSerializer
+                examples=[
+                    OpenApiExample(
+                        name='Attendance Marked',
+                        value={
+                            'message': 'Attendance marked successfully',
+                            'attendance': {
+                                'id': 1,
+                                'student': 2,
+                                'course': 1,
+                                'timetable': 1,
+                                'timestamp': '2025-06-02T08:15:00Z',
+                                'latitude': 6.5244,
+                                'longitude': 3.3792,
+                                'status': 1
+                            }
+                        }
+                    )
+                ]
             ),
             400: OpenApiResponse(
-                description='Attendance already marked'
+                description='Invalid coordinates or attendance already marked'
             ),
             403: OpenApiResponse(
                 description='Not allowed'
@@ -254,55 +326,123 @@ class AttendanceViewSet(viewsets.ModelViewSet):
         if user.user_type != User.UserType.STUDENT:
             return Response({'error': 'Only students can mark attendance'}, status=status.HTTP_403_FORBIDDEN)
         
-        latitude = request.data.get('latitude')
-        longitude = request.data.get('longitude')
+        coordinates = parse_coordinates(request.data)
+        if coordinates is None:
+            return Response({'error': 'Valid latitude and longitude are required'}, status=status.HTTP_400_BAD_REQUEST)
+        latitude, longitude = coordinates
         
-        current_time = timezone.now().time()
-        today = timezone.now().weekday()
-        
-        current_timetable = Timetable.objects.filter(
-            day_of_week=today,
-            start_time__lte=current_time,
-            end_time__gte=current_time,
-            course__department=user.department,
-            active=True
-        ).first()
+        current_timetable = Timetable.current_for_department(user.department_id)
         
         if not current_timetable:
             return Response({'error': 'No active class at this time'}, status=status.HTTP_403_FORBIDDEN)
         
-        existing_attendance = Attendance.objects.filter(
-            student=user,
-            timetable=current_timetable
-        ).exists()
-        
-        if existing_attendance:
-            return Response({'error': 'Attendance already marked for this class'}, status=status.HTTP_400_BAD_REQUEST)
-        
         lecture_hall = current_timetable.lecture_hall
-        hall_coords = (lecture_hall.latitude, lecture_hall.longitude)
-        student_coords = (float(latitude), float(longitude))
+        distance = lecture_hall.distance_to(latitude, longitude)
         
-        distance = geopy.distance.distance(hall_coords, student_coords).m
-        
-        if distance > lecture_hall.radius:
+        if not distance <= lecture_hall.radius:
             return Response({
                 'error': 'You must be in the lecture hall to mark attendance',
                 'distance': distance,
                 'allowed_radius': lecture_hall.radius
             }, status=status.HTTP_403_FORBIDDEN)
         
-        attendance = Attendance.objects.create(
-            student=user,
-            course=current_timetable.course,
-            timetable=current_timetable,
-            latitude=latitude,
-            longitude=longitude
-        )
+        try:
+            with transaction.atomic():
+                attendance = Attendance.objects.create(
+                    student=user,
+                    course=current_timetable.course,
+                    timetable=current_timetable,
+                    latitude=latitude,
+                    longitude=longitude
+                )
+        except IntegrityError:
+            # Rejected by the uniq_attendance_per_class constraint
+            return Response({'error': 'Attendance already marked for this class'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'message': 'Attendance marked successfully',
+            'attendance': {
+                'id': attendance.id,
+                'student': attendance.student_id,
+                'course': attendance.course_id,
+                'timetable': attendance.timetable_id,
+                'timestamp': attendance.timestamp,
+                'latitude': attendance.latitude,
+                'longitude': attendance.longitude,
+                'status': attendance.status
+            }
+        }, status=status.HTTP_201_CREATED)
+    
+    @extend_schema(
+        request={
+            'application/json': {
+                'type': 'object',
+                'properties': {
+                    'timetable_id': {'type': 'integer', 'example': 1},
+                    'student_ids': {'type': 'array', 'items': {'type': 'integer'}, 'example': [2, 3, 4]},
+                },
+                'required': ['timetable_id', 'student_ids']
+            }
+        },
+        responses={
+            201: OpenApiResponse(
+                description='Attendance marked; submitted counts newly inserted records, students already marked are skipped',
+                examples=[
+                    OpenApiExample(
+                        name='Bulk Marked',
+                        value={
+                            'message': 'Attendance marked successfully',
+                            'submitted': 3
+                        }
+                    )
+                ]
+            ),
+            400: OpenApiResponse(
+                description='Missing or non-integer timetable_id or student_ids'
+            ),
+            403: OpenApiResponse(
+                description='Not allowed'
+            ),
+            404: OpenApiResponse(
+                description='Timetable not found'
+            )
+        },
+        methods=['POST'],
+        description='Mark a batch of students present for one of your classes'
+    )
+    @action(detail=False, methods=['post'])
+    def bulk_mark_attendance(self, request):
+        user = request.user
+        if user.user_type != User.UserType.LECTURER:
+            return Response({'error': 'Only lecturers can bulk mark attendance'}, status=status.HTTP_403_FORBIDDEN)
+        
+        student_ids = request.data.get('student_ids')
+        if not isinstance(student_ids, list):
+            return Response({'error': 'timetable_id and student_ids are required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            timetable_id = int(request.data.get('timetable_id'))
+            student_ids = [int(student_id) for student_id in student_ids]
+        except (TypeError, ValueError):
+            return Response({'error': 'timetable_id and student_ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            timetable = Timetable.objects.select_related('course').get(pk=timetable_id, lecturer=user)
+        except Timetable.DoesNotExist:
+            return Response({'error': 'Timetable not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        students = User.objects.filter(
+            pk__in=student_ids,
+            user_type=User.UserType.STUDENT,
+            department_id=timetable.course.department_id,
+            level=timetable.course.level
+        ).only('id')
+        
+        submitted = Attendance.objects.bulk_mark_present(timetable, students)
         
         return Response({
             'message': 'Attendance marked successfully',
-            'attendance': AttendanceSerializer(attendance).data
+            'submitted': submitted
         }, status=status.HTTP_201_CREATED)
     
     @extend_schema(
@@ -313,6 +453,13 @@ class AttendanceViewSet(viewsets.ModelViewSet):
                 location=OpenApiParameter.QUERY,
                 description='Filter by course ID',
                 required=False
+            ),
+            OpenApiParameter(
+                name='cursor',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Pagination cursor value',
+                required=False
             )
         ],
         responses={
@@ -331,11 +478,16 @@ class AttendanceViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Only students can view their attendance'}, status=status.HTTP_403_FORBIDDEN)
         
         course_id = request.query_params.get('course_id')
-        queryset = Attendance.objects.filter(student=user)
+        queryset = self.get_queryset()
         
         if course_id:
             queryset = queryset.filter(course_id=course_id)
         
+        page = self.paginate_queryset(queryset.order_by('-timestamp'))
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
     
@@ -358,7 +510,8 @@ class AttendanceViewSet(viewsets.ModelViewSet):
         methods=['GET'],
         description='Get attendance statistics for a course'
     )
-    @action(detail=False, methods=['get'])
+    # Returns a bare list (lecturers) or a single object (students), never a page
+    @action(detail=False, methods=['get'], pagination_class=None)
     def course_stats(self, request):
         user = request.user
         course_id = request.query_params.get('course_id')
@@ -372,70 +525,78 @@ class AttendanceViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Course not found'}, status=status.HTTP_404_NOT_FOUND)
         
         if user.user_type == User.UserType.STUDENT:
-            total_classes = Timetable.objects.filter(course=course).count()
-            attended_classes = Attendance.objects.filter(
-                student=user, 
-                course=course,
-                status=Attendance.Status.PRESENT
-            ).count()
+            total_classes = Timetable.total_classes(course.pk)
+            attended_classes = StudentCourseStats.objects.filter(
+                student=user,
+                course=course
+            ).values_list('attended', flat=True).first() or 0
             percentage = (attended_classes / total_classes * 100) if total_classes > 0 else 0
+            quartile = compute_quartile(percentage)
             
             return Response({
                 'total_classes': total_classes,
                 'attended_classes': attended_classes,
                 'percentage': percentage,
-                'quartile': Attendance._meta.get_field('quartile').value_from_object(Attendance(
-                    student=user,
-                    course=course,
-                    timetable=None
-                )),
-                'feedback': Attendance._meta.get_field('feedback_message').value_from_object(Attendance(
-                    student=user,
-                    course=course,
-                    timetable=None
-                ))
+                'quartile': quartile,
+                'feedback': feedback_for_quartile(quartile)
             })
         
         elif user.user_type == User.UserType.LECTURER:
-            if course not in user.courses.all():
+            if not user.courses.filter(pk=course.pk).exists():
                 return Response({'error': 'You are not teaching this course'}, status=status.HTTP_403_FORBIDDEN)
             
+            total_classes = Timetable.total_classes(course.pk)
+            
+            if total_classes > 0:
+                percentage = ExpressionWrapper(
+                    F('attended_classes') * 100.0 / total_classes,
+                    output_field=FloatField()
+                )
+            else:
+                percentage = Value(0.0, output_field=FloatField())
+            
             students = User.objects.filter(
                 user_type=User.UserType.STUDENT,
                 department=course.department,
                 level=course.level
             ).annotate(
-                attended_classes=Count(
-                    'attendance',
-                    filter=Q(attendance__course=course, attendance__status=Attendance.Status.PRESENT)
+                # Read from the maintained per-course counts instead of grouping users by their attendance
+                attended_classes=Coalesce(
+                    Subquery(
+                        StudentCourseStats.objects.filter(
+                            student=OuterRef('pk'),
+                            course=course
+                        ).values('attended')[:1]
+                    ),
+                    0
+                )
+            ).annotate(
+                percentage=percentage
+            ).annotate(
+                # Mirrors compute_quartile()
+                quartile=Case(
+                    When(percentage=0, then=Value(0)),
+                    When(percentage__lte=25, then=Value(1)),
+                    When(percentage__lte=50, then=Value(2)),
+                    When(percentage__lte=75, then=Value(3)),
+                    When(percentage__lt=100, then=Value(4)),
+                    default=Value(5),
+                    output_field=IntegerField()
+                )
+            ).annotate(
+                feedback=Case(
+                    *[When(quartile=quartile, then=Value(message)) for quartile, message in FEEDBACK_MESSAGES.items()],
+                    default=Value(''),
+                    output_field=CharField()
                 )
             )
             
-            total_classes = Timetable.objects.filter(course=course).count()
-            
-            result = []
-            for student in students:
-                percentage = (student.attended_classes / total_classes * 100) if total_classes > 0 else 0
-                
-                result.append({
-                    'student_id': student.id,
-                    'matric_number': student.matric_number,
-                    'full_name': student.get_full_name(),
-                    'attended_classes': student.attended_classes,
-                    'percentage': percentage,
-                    'quartile': Attendance._meta.get_field('quartile').value_from_object(Attendance(
-                        student=student,
-                        course=course,
-                        timetable=None
-                    )),
-                    'feedback': Attendance._meta.get_field('feedback_message').value_from_object(Attendance(
-                        student=student,
-                        course=course,
-                        timetable=None
-                    ))
-                })
-            
-            return Response(result)
+            serializer = AttendanceStatsSerializer(students.values(
+                'matric_number', 'attended_classes', 'percentage', 'quartile', 'feedback',
+                student_id=F('id'),
+                full_name=Trim(Concat('first_name', Value(' '), 'last_name'))
+            ), many=True)
+            return Response(serializer.data)
     
     @extend_schema(
         parameters=[
@@ -481,48 +642,37 @@ class AttendanceViewSet(viewsets.ModelViewSet):
         if user.user_type == User.UserType.STUDENT:
             queryset = Attendance.objects.filter(student=user, course=course)
         elif user.user_type == User.UserType.LECTURER:
-            if course not in user.courses.all():
+            if not user.courses.filter(pk=course.pk).exists():
                 return Response({'error': 'You are not teaching this course'}, status=status.HTTP_403_FORBIDDEN)
             queryset = Attendance.objects.filter(course=course)
         else:
             queryset = Attendance.objects.filter(course=course)
         
         if format == 'csv':
-            response = HttpResponse(content_type='text/csv')
-            response['Content-Disposition'] = f'attachment; filename="attendance_{course.code}.csv"'
+            writer = csv.writer(Echo())
             
-            writer = csv.writer(response)
-            writer.writerow(['S/N', 'Matric Number', 'Full Name', 'Timestamp', 'Status'])
+            def rows():
+                yield writer.writerow(['S/N', 'Matric Number', 'Full Name', 'Timestamp', 'Status'])
+                for row in export_rows(queryset, chunk_size=2000):
+                    yield writer.writerow(row)
             
-            for idx, attendance in enumerate(queryset, start=1):
-                writer.writerow([
-                    idx,
-                    attendance.student.matric_number,
-                    attendance.student.get_full_name(),
-                    attendance.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                    attendance.get_status_display()
-                ])
-            
-            return response
+            return StreamingHttpResponse(
+                rows(),
+                content_type='text/csv',
+                headers={'Content-Disposition': f'attachment; filename="attendance_{course.code}.csv"'}
+            )
         
         elif format == 'xlsx':
             response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
             response['Content-Disposition'] = f'attachment; filename="attendance_{course.code}.xlsx"'
             
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Attendance"
+            wb = openpyxl.Workbook(write_only=True)
+            ws = wb.create_sheet("Attendance")
             
             ws.append(['S/N', 'Matric Number', 'Full Name', 'Timestamp', 'Status'])
             
-            for idx, attendance in enumerate(queryset, start=1):
-                ws.append([
-                    idx,
-                    attendance.student.matric_number,
-                    attendance.student.get_full_name(),
-                    attendance.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                    attendance.get_status_display()
-                ])
+            for row in export_rows(queryset, chunk_size=2000):
+                ws.append(row)
             
             wb.save(response)
             return response
@@ -531,34 +681,30 @@ class AttendanceViewSet(viewsets.ModelViewSet):
             response = HttpResponse(content_type='application/pdf')
             response['Content-Disposition'] = f'attachment; filename="attendance_{course.code}.pdf"'
             
-            buffer = BytesIO()
-            p = canvas.Canvas(buffer)
+            p = canvas.Canvas(response)
             
             p.drawString(100, 800, f"Attendance Report for {course.code} - {course.title}")
             p.drawString(100, 780, "Generated on: " + timezone.now().strftime('%Y-%m-%d %H:%M:%S'))
             
             y = 750
-            p.drawString(100, y, "S/N")
-            p.drawString(150, y, "Matric Number")
-            p.drawString(300, y, "Full Name")
-            p.drawString(450, y, "Timestamp")
-            p.drawString(550, y, "Status")
+            draw_pdf_column_headers(p, y)
             
-            for idx, attendance in enumerate(queryset, start=1):
+            for idx, matric_number, full_name, timestamp, status_display in export_rows(queryset, chunk_size=500):
                 y -= 20
+                if y < 50:
+                    p.showPage()
+                    y = 800
+                    draw_pdf_column_headers(p, y)
+                    y -= 20
                 p.drawString(100, y, str(idx))
-                p.drawString(150, y, attendance.student.matric_number)
-                p.drawString(300, y, attendance.student.get_full_name())
-                p.drawString(450, y, attendance.timestamp.strftime('%Y-%m-%d %H:%M:%S'))
-                p.drawString(550, y, attendance.get_status_display())
+                p.drawString(150, y, matric_number)
+                p.drawString(300, y, full_name)
+                p.drawString(450, y, timestamp)
+                p.drawString(550, y, status_display)
             
             p.showPage()
             p.save()
             
-            pdf = buffer.getvalue()
-            buffer.close()
-            response.write(pdf)
-            
             return response
         
         else:
@@ -585,16 +731,7 @@ class CurrentClassView(APIView):
         if user.user_type != User.UserType.STUDENT:
             return Response({'error': 'Only students can check current class'}, status=status.HTTP_403_FORBIDDEN)
         
-        current_time = timezone.now().time()
-        today = timezone.now().weekday()
-        
-        current_timetable = Timetable.objects.filter(
-            day_of_week=today,
-            start_time__lte=current_time,
-            end_time__gte=current_time,
-            course__department=user.department,
-            active=True
-        ).first()
+        current_timetable = Timetable.current_for_department(user.department_id)
         
         if not current_timetable:
             return Response({'error': 'No active class at this time'}, status=status.HTTP_404_NOT_FOUND)
@@ -626,34 +763,51 @@ class ValidateAttendanceView(APIView):
     )
     def post(self, request):
         # This should be run as a periodic task (e.g., every hour)
-        current_time = timezone.now().time()
-        today = timezone.now().weekday()
+        now = timezone.now()
+        current_time = now.time()
+        today = now.weekday()
         
         # Get all timetables that just ended (within last 1 hour)
-        one_hour_ago = (datetime.now() - timedelta(hours=1)).time()
-        recent_classes = Timetable.objects.filter(
-            day_of_week=today,
-            end_time__gte=one_hour_ago,
-            end_time__lte=current_time,
-            active=True
+        one_hour_ago = now - timedelta(hours=1)
+        if one_hour_ago.date() == now.date():
+            recently_ended = Q(day_of_week=today, end_time__gte=one_hour_ago.time(), end_time__lte=current_time)
+        else:
+            # The window wraps past midnight into the previous day's timetable
+            recently_ended = (
+                Q(day_of_week=one_hour_ago.weekday(), end_time__gte=one_hour_ago.time()) |
+                Q(day_of_week=today, end_time__lte=current_time)
+            )
+        recent_classes = Timetable.objects.filter(recently_ended, active=True)
+        
+        marked_attendance = Attendance.objects.filter(
+            timetable=OuterRef('pk')
+        ).order_by().values('timetable').annotate(count=Count('*')).values('count')
+        
+        total_students = User.objects.filter(
+            user_type=User.UserType.STUDENT,
+            department=OuterRef('course__department'),
+            level=OuterRef('course__level')
+        ).order_by().values('department').annotate(count=Count('*')).values('count')
+        
+        # Classes where less than 10% of the students marked attendance;
+        # classes without any enrolled students are left alone
+        undermarked_classes = recent_classes.annotate(
+            marked_attendance=Coalesce(Subquery(marked_attendance), 0),
+            total_students=Coalesce(Subquery(total_students), 0)
+        ).filter(
+            total_students__gt=0,
+            marked_attendance__lt=F('total_students') * 0.1
         )
         
-        voided_count = 0
+        # Void all attendance for those timetables in a single UPDATE
+        voided_count = Attendance.objects.filter(
+            timetable__in=undermarked_classes.values('pk')
+        ).update(status=Attendance.Status.VOIDED)
+        
+        if voided_count:
+            # Queryset updates bypass the Attendance signals
+            StudentCourseStats.objects.recount(course__in=recent_classes.values('course'))
         
-        for timetable in recent_classes:
-            total_students = User.objects.filter(
-                user_type=User.UserType.STUDENT,
-                department=timetable.course.department,
-                level=timetable.course.level
-            ).count()
-            
-            marked_attendance = Attendance.objects.filter(timetable=timetable).count()
-            
-            if marked_attendance / total_students < 0.1:  # Less than 10%
-                # Void all attendance for this timetable
-                voided = Attendance.objects.filter(timetable=timetable).update(status=Attendance.Status.VOIDED)
-                voided_count += voided
-                
         return Response({
             'message': 'Attendance validated',
             'voided_count': voided_count,
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from app.models import User, Attendance
+
+# Letter codes stored before Attendance.status and User.gender became IntegerChoices
+CONVERSIONS = [
+    (Attendance, 'status', {'P': Attendance.Status.PRESENT, 'A': Attendance.Status.ABSENT, 'V': Attendance.Status.VOIDED}),
+    (User, 'gender', {'M': User.Gender.MALE, 'F': User.Gender.FEMALE, 'O': User.Gender.OTHER}),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Convert letter-coded Attendance.status and User.gender values to their integer codes. '
+        'On PostgreSQL run it before altering the columns to smallint.'
+    )
+
+    def handle(self, *args, **options):
+        # Raw SQL: the integer fields cannot prepare the old letters as query parameters
+        with transaction.atomic(), connection.cursor() as cursor:
+            for model, field_name, mapping in CONVERSIONS:
+                table = connection.ops.quote_name(model._meta.db_table)
+                column = connection.ops.quote_name(model._meta.get_field(field_name).column)
+                for letter, value in mapping.items():
+                    cursor.execute(
+                        f'UPDATE {table} SET {column} = %s WHERE {column} = %s',
+                        [str(value.value), letter]
+                    )
+                    if cursor.rowcount:
+                        self.stdout.write(f'{model.__name__}.{field_name}: {letter} -> {value.value} ({cursor.rowcount} rows)')
+        self.stdout.write(self.style.SUCCESS('Status and gender codes converted'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from app.models import StudentCourseStats
+
+
+class Command(BaseCommand):
+    help = 'Recompute StudentCourseStats from the attendance table'
+
+    def handle(self, *args, **options):
+        StudentCourseStats.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS('Attendance stats rebuilt'))
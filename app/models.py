@@ -1,7 +1,50 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, ExpressionWrapper, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
+from django.utils.functional import cached_property
+from django.core.cache import cache
+import math
+
+FEEDBACK_MESSAGES = {
+    0: "Bro you no dey come class?!! Shuu !! 🤦🏽‍♂️",
+    1: "Better dey try come class o!",
+    2: "Why you dey miss class na?",
+    3: "No miss class oh, make you no fail!",
+    4: "Omo, you dey try. Just add small pepper 🫡",
+    5: "Responsible pikin, you know wetin you come do for school! 👏"
+}
+
+EARTH_RADIUS_M = 6371000.0
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres between two points given in degrees."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2 +
+        math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    # Rounding can push a just past 1 for antipodal points
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(a, 1.0)))
+
+def compute_quartile(percentage):
+    if percentage == 0:
+        return 0
+    elif percentage <= 25:
+        return 1
+    elif percentage <= 50:
+        return 2
+    elif percentage <= 75:
+        return 3
+    elif percentage < 100:
+        return 4
+    else:
+        return 5
+
+def feedback_for_quartile(quartile):
+    return FEEDBACK_MESSAGES.get(quartile, "")
 
 class UserManager(BaseUserManager):
     def create_user(self, username, email=None, password=None, **extra_fields):
@@ -13,7 +56,7 @@ class UserManager(BaseUserManager):
         email = self.normalize_email(email)
         user = self.model(username=username, email=email, **extra_fields)
         user.set_password(password)
-        user.save()
+        user.save(force_insert=True, using=self._db)
         return user
 
     def create_superuser(self, username, email=None, password=None, **extra_fields):
@@ -28,6 +71,12 @@ class UserManager(BaseUserManager):
             raise ValueError('Superuser must have is_superuser=True.')
         
         return self.create_user(username, email, password, **extra_fields)
+    
+    def get_by_natural_key(self, username):
+        # Used by authenticate(); login never reads the signature or last location
+        return self.defer('digital_signature', 'last_login_location').get(
+            **{self.model.USERNAME_FIELD: username}
+        )
 
 class User(AbstractUser):
     class UserType(models.IntegerChoices):
@@ -35,24 +84,24 @@ class User(AbstractUser):
         LECTURER = 2, 'Lecturer'
         ADMIN = 3, 'Admin'
     
-    class Gender(models.TextChoices):
-        MALE = 'M', 'Male'
-        FEMALE = 'F', 'Female'
-        OTHER = 'O', 'Other'
+    class Gender(models.IntegerChoices):
+        MALE = 1, 'Male'
+        FEMALE = 2, 'Female'
+        OTHER = 3, 'Other'
     
     objects = UserManager()
     
     user_type = models.PositiveSmallIntegerField(choices=UserType.choices)
     matric_number = models.CharField(max_length=20, unique=True, blank=True, null=True)
     department = models.ForeignKey('Department', on_delete=models.SET_NULL, null=True)
-    digital_signature = models.TextField(blank=True)
+    digital_signature = models.FileField(upload_to='signatures/', blank=True)
     level = models.IntegerField(
         blank=True, 
         null=True, 
         validators=[MinValueValidator(100), MaxValueValidator(900)]
     )
     courses = models.ManyToManyField('Course', blank=True)
-    gender = models.CharField(max_length=1, choices=Gender.choices, blank=True, null=True)
+    gender = models.PositiveSmallIntegerField(choices=Gender.choices, blank=True, null=True)
     last_login_location = models.JSONField(blank=True, null=True)
     
     def __str__(self):
@@ -77,12 +126,25 @@ class Course(models.Model):
 class LectureHall(models.Model):
     name = models.CharField(max_length=50)
     building = models.CharField(max_length=50)
-    latitude = models.DecimalField(max_digits=9, decimal_places=6)
-    longitude = models.DecimalField(max_digits=9, decimal_places=6)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
     radius = models.IntegerField(default=100)  # in meters
     
     def __str__(self):
         return f"{self.building} - {self.name}"
+    
+    def distance_to(self, latitude, longitude):
+        """Great-circle distance in metres from the hall to a point."""
+        return haversine_m(self.latitude, self.longitude, latitude, longitude)
+
+class TimetableQuerySet(models.QuerySet):
+    def with_active_flag(self):
+        now = timezone.now()
+        current_time = now.time()
+        return self.annotate(is_active_now=ExpressionWrapper(
+            Q(active=True, day_of_week=now.weekday(), start_time__lte=current_time, end_time__gte=current_time),
+            output_field=models.BooleanField()
+        ))
 
 class Timetable(models.Model):
     class DayOfWeek(models.IntegerChoices):
@@ -103,78 +165,163 @@ class Timetable(models.Model):
     active = models.BooleanField(default=True)
     semester = models.CharField(max_length=50)
     
+    objects = TimetableQuerySet.as_manager()
+    
     class Meta:
         ordering = ['day_of_week', 'start_time']
         unique_together = ('course', 'day_of_week', 'start_time', 'semester')
+        indexes = [
+            # Serves the current-class lookup in current_for_department()
+            models.Index(
+                fields=['day_of_week', 'start_time', 'end_time'],
+                condition=Q(active=True),
+                name='timetable_active_slot_idx'
+            ),
+        ]
     
-    @property
-    def is_active_now(self):
-        now = timezone.now()
+    def is_active_at(self, now):
+        # Python counterpart of TimetableQuerySet.with_active_flag() for instances loaded without it
         current_time = now.time()
-        current_day = now.weekday()
-        
-        return (
-            self.day_of_week == current_day and
-            self.start_time <= current_time <= self.end_time and
-            self.active
+        return (self.active and self.day_of_week == now.weekday()
+                and self.start_time <= current_time <= self.end_time)
+    
+    @staticmethod
+    def total_classes_cache_key(course_id):
+        return f'timetable_count:{course_id}'
+    
+    @classmethod
+    def total_classes(cls, course_id):
+        # Invalidated by the Timetable save/delete signals in app.signals; the short TTL
+        # bounds staleness in workers whose local cache the signal did not reach
+        return cache.get_or_set(
+            cls.total_classes_cache_key(course_id),
+            lambda: cls.objects.filter(course_id=course_id).count(),
+            60
         )
+    
+    @classmethod
+    def current_for_department(cls, department_id, now=None):
+        # Uncached so hall and course edits reach the geofence immediately; served by timetable_active_slot_idx
+        now = now or timezone.now()
+        current_time = now.time()
+        return cls.objects.with_active_flag().select_related('lecture_hall', 'course').filter(
+            day_of_week=now.weekday(),
+            start_time__lte=current_time,
+            end_time__gte=current_time,
+            course__department_id=department_id,
+            active=True
+        ).first()
+
+class AttendanceManager(models.Manager):
+    def bulk_mark_present(self, timetable, students):
+        # Students who already have a record for this class are skipped by the unique constraint;
+        # returns how many records were actually inserted
+        with transaction.atomic():
+            marked = self.filter(timetable=timetable, student__in=students)
+            already_marked = marked.count()
+            self.bulk_create(
+                [
+                    self.model(student=student, course_id=timetable.course_id, timetable=timetable)
+                    for student in students
+                ],
+                batch_size=1000,
+                ignore_conflicts=True
+            )
+            StudentCourseStats.objects.bulk_create(
+                [StudentCourseStats(student=student, course_id=timetable.course_id) for student in students],
+                batch_size=1000,
+                ignore_conflicts=True
+            )
+            StudentCourseStats.objects.recount(course_id=timetable.course_id, student__in=students)
+            return marked.count() - already_marked
 
 class Attendance(models.Model):
-    class Status(models.TextChoices):
-        PRESENT = 'P', 'Present'
-        ABSENT = 'A', 'Absent'
-        VOIDED = 'V', 'Voided'
+    class Status(models.IntegerChoices):
+        PRESENT = 1, 'Present'
+        ABSENT = 2, 'Absent'
+        VOIDED = 3, 'Voided'
     
     student = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'user_type': User.UserType.STUDENT})
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     timetable = models.ForeignKey(Timetable, on_delete=models.CASCADE)
     timestamp = models.DateTimeField(auto_now_add=True)
-    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
-    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
-    status = models.CharField(max_length=1, choices=Status.choices, default=Status.PRESENT)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    status = models.PositiveSmallIntegerField(choices=Status.choices, default=Status.PRESENT)
+    
+    objects = AttendanceManager()
     
     class Meta:
-        unique_together = ('student', 'timetable')
         ordering = ['-timestamp']
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'timetable'], name='uniq_attendance_per_class'),
+        ]
+        indexes = [
+            # Per-student counts (StudentCourseStats recount) and per-course exports/stats
+            models.Index(fields=['student', 'course', 'status'], name='att_stu_crs_stat'),
+            models.Index(fields=['course', 'status'], name='att_crs_stat'),
+            # Default ordering and cursor pagination
+            models.Index(fields=['-timestamp'], name='att_timestamp_desc'),
+        ]
     
     def __str__(self):
         return f"{self.student} - {self.course} - {self.timestamp}"
     
-    @property
+    # Cached per instance; serializing a row reads all three
+    @cached_property
     def attendance_percentage(self):
-        total_classes = Timetable.objects.filter(course=self.course, active=True).count()
-        attended_classes = Attendance.objects.filter(
-            student=self.student, 
-            course=self.course,
-            status=Attendance.Status.PRESENT
-        ).count()
+        total_classes = Timetable.objects.filter(course_id=self.course_id, active=True).count()
+        attended_classes = StudentCourseStats.objects.filter(
+            student_id=self.student_id,
+            course_id=self.course_id
+        ).values_list('attended', flat=True).first() or 0
         return (attended_classes / total_classes * 100) if total_classes > 0 else 0
     
-    @property
+    @cached_property
     def quartile(self):
-        percentage = self.attendance_percentage
-        if percentage == 0:
-            return 0
-        elif percentage <= 25:
-            return 1
-        elif percentage <= 50:
-            return 2
-        elif percentage <= 75:
-            return 3
-        elif percentage < 100:
-            return 4
-        else:
-            return 5
-    
-    @property
+        return compute_quartile(self.attendance_percentage)
+    
+    @cached_property
     def feedback_message(self):
-        quartile = self.quartile
-        messages = {
-            0: "Bro you no dey come class?!! Shuu !! 🤦🏽‍♂️",
-            1: "Better dey try come class o!",
-            2: "Why you dey miss class na?",
-            3: "No miss class oh, make you no fail!",
-            4: "Omo, you dey try. Just add small pepper 🫡",
-            5: "Responsible pikin, you know wetin you come do for school! 👏"
-        }
-        return messages.get(quartile, "")
\ No newline at end of file
+        return feedback_for_quartile(self.quartile)
+
+class StudentCourseStatsManager(models.Manager):
+    def recount(self, **filters):
+        # Recompute attended from Attendance for existing rows matching filters
+        attended = Attendance.objects.filter(
+            student=OuterRef('student'),
+            course=OuterRef('course'),
+            status=Attendance.Status.PRESENT
+        ).order_by().values('student').annotate(count=Count('id')).values('count')
+        return self.filter(**filters).update(attended=Coalesce(Subquery(attended), 0))
+    
+    def rebuild(self):
+        counts = Attendance.objects.filter(
+            status=Attendance.Status.PRESENT
+        ).order_by().values_list('student', 'course').annotate(Count('id'))
+        with transaction.atomic():
+            self.update(attended=0)
+            self.bulk_create(
+                [
+                    self.model(student_id=student_id, course_id=course_id, attended=attended)
+                    for student_id, course_id, attended in counts
+                ],
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['student', 'course'],
+                update_fields=['attended']
+            )
+
+class StudentCourseStats(models.Model):
+    # Denormalized count of a student's present attendance per course, kept in sync by app.signals
+    student = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'user_type': User.UserType.STUDENT})
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    attended = models.PositiveIntegerField(default=0)
+    
+    objects = StudentCourseStatsManager()
+    
+    class Meta:
+        unique_together = ('student', 'course')
+    
+    def __str__(self):
+        return f"{self.student} - {self.course} - {self.attended}"
@@ -1,12 +1,39 @@
 from rest_framework import serializers
-from django.contrib.auth.hashers import make_password
-from .models import User, Department, Course, LectureHall, Timetable, Attendance
+from django.utils import timezone
+from django.db.models import Count
+from django.db.models.manager import BaseManager
+from .models import (
+    User, Department, Course, LectureHall, Timetable, Attendance, StudentCourseStats,
+    compute_quartile, feedback_for_quartile
+)
 import base64
 from django.core.files.base import ContentFile
 
+class Base64ImageField(serializers.ImageField):
+    # Accepts "data:image/<ext>;base64,<payload>" strings, decoded once and checked by Pillow
+    def validate_empty_values(self, data):
+        if data == '':
+            data = None
+        return super().validate_empty_values(data)
+    
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            # Decode past the marker directly, without splitting the payload into a second copy
+            idx = data.find(';base64,')
+            if idx == -1:
+                self.fail('invalid_image')
+            ext = data[:idx].rsplit('/', 1)[-1]
+            try:
+                decoded = base64.b64decode(data[idx + len(';base64,'):], validate=True)
+            except ValueError:
+                # binascii.Error for bad base64, plain ValueError for non-ASCII input
+                self.fail('invalid_image')
+            data = ContentFile(decoded, name=f"signature.{ext}")
+        return super().to_internal_value(data)
+
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, style={'input_type': 'password'})
-    digital_signature = serializers.CharField(required=False, allow_blank=True)
+    digital_signature = Base64ImageField(write_only=True, required=False, allow_null=True)
     
     class Meta:
         model = User
@@ -17,60 +44,118 @@ class UserSerializer(serializers.ModelSerializer):
         ]
         extra_kwargs = {
             'password': {'write_only': True},
-            'digital_signature': {'write_only': True}
+            'digital_signature': {'write_only': True},
+            'gender': {'help_text': '1 = Male, 2 = Female, 3 = Other; the old letter codes M/F/O are rejected with 400'}
         }
     
     def create(self, validated_data):
-        signature_data = validated_data.pop('digital_signature', None)
+        signature = validated_data.pop('digital_signature', None)
         password = validated_data.pop('password')
         
-        user = User.objects.create(
-            **validated_data,
-            password=make_password(password)
-        )
-        
-        if signature_data:
-            format, imgstr = signature_data.split(';base64,')
-            ext = format.split('/')[-1]
-            file_name = f"signature_{user.matric_number}.{ext}"
-            data = ContentFile(base64.b64decode(imgstr), name=file_name)
-            user.digital_signature.save(file_name, data, save=True)
+        if signature:
+            # Written under upload_to by the FileField when the user row is inserted
+            ext = signature.name.rsplit('.', 1)[-1]
+            matric = str(validated_data.get('matric_number')).replace('/', '_')
+            signature.name = f"signature_{matric}.{ext}"
+            validated_data['digital_signature'] = signature
         
-        return user
+        return User.objects.create_user(password=password, **validated_data)
+
+class LeanUserSerializer(serializers.ModelSerializer):
+    # Student summary nested in attendance rows; keep in step with AttendanceViewSet's only()
+    class Meta:
+        model = User
+        fields = ['id', 'matric_number', 'first_name', 'last_name']
 
 class DepartmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Department
-        fields = '__all__'
+        fields = ['id', 'name', 'code']
 
 class CourseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Course
-        fields = '__all__'
+        fields = ['id', 'code', 'title', 'department', 'level']
 
 class LectureHallSerializer(serializers.ModelSerializer):
     class Meta:
         model = LectureHall
-        fields = '__all__'
+        fields = ['id', 'name', 'building', 'latitude', 'longitude', 'radius']
 
 class TimetableSerializer(serializers.ModelSerializer):
-    is_active_now = serializers.BooleanField(read_only=True)
+    is_active_now = serializers.SerializerMethodField()
     
     class Meta:
         model = Timetable
-        fields = '__all__'
+        fields = [
+            'id', 'course', 'lecturer', 'day_of_week', 'start_time', 'end_time',
+            'lecture_hall', 'active', 'semester', 'is_active_now'
+        ]
+    
+    def get_is_active_now(self, obj) -> bool:
+        # Annotated by Timetable.objects.with_active_flag(); computed here when it wasn't
+        is_active_now = getattr(obj, 'is_active_now', None)
+        if is_active_now is None:
+            return obj.is_active_at(timezone.now())
+        return is_active_now
+
+def attendance_percentage_map(attendances):
+    # {(student_id, course_id): percentage} for every pair in attendances, in two queries
+    student_ids = {attendance.student_id for attendance in attendances}
+    course_ids = {attendance.course_id for attendance in attendances}
+    if not student_ids:
+        return {}
+    
+    total_classes = dict(
+        Timetable.objects.filter(course_id__in=course_ids, active=True)
+        .order_by().values_list('course').annotate(Count('id'))
+    )
+    attended_classes = StudentCourseStats.objects.filter(
+        student_id__in=student_ids,
+        course_id__in=course_ids
+    ).values_list('student', 'course', 'attended')
+    
+    return {
+        (student_id, course_id): (attended / total_classes[course_id] * 100) if total_classes.get(course_id) else 0
+        for student_id, course_id, attended in attended_classes
+    }
+
+class AttendanceListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        attendances = list(data.all() if isinstance(data, BaseManager) else data)
+        self.context['pct_map'] = attendance_percentage_map(attendances)
+        return super().to_representation(attendances)
 
 class AttendanceSerializer(serializers.ModelSerializer):
-    student = UserSerializer(read_only=True)
+    student = LeanUserSerializer(read_only=True)
     course = CourseSerializer(read_only=True)
     timetable = TimetableSerializer(read_only=True)
-    attendance_percentage = serializers.FloatField(read_only=True)
-    quartile = serializers.IntegerField(read_only=True)
-    feedback_message = serializers.CharField(read_only=True)
+    attendance_percentage = serializers.SerializerMethodField()
+    quartile = serializers.SerializerMethodField()
+    feedback_message = serializers.SerializerMethodField()
     
     class Meta:
         model = Attendance
-        fields = '__all__'
+        list_serializer_class = AttendanceListSerializer
+        fields = [
+            'id', 'student', 'course', 'timetable', 'timestamp',
+            'latitude', 'longitude', 'status',
+            'attendance_percentage', 'quartile', 'feedback_message'
+        ]
+        read_only_fields = fields
+    
+    def get_attendance_percentage(self, obj) -> float:
+        pct_map = self.context.get('pct_map')
+        if pct_map is None:
+            # Serializing a single record, no list-level map was built
+            return obj.attendance_percentage
+        return pct_map.get((obj.student_id, obj.course_id), 0)
+    
+    def get_quartile(self, obj) -> int:
+        return compute_quartile(self.get_attendance_percentage(obj))
+    
+    def get_feedback_message(self, obj) -> str:
+        return feedback_for_quartile(self.get_quartile(obj))
 
 class AttendanceStatsSerializer(serializers.Serializer):
     student_id = serializers.IntegerField()
@@ -0,0 +1,39 @@
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Timetable, Attendance, StudentCourseStats
+
+@receiver([post_save, post_delete], sender=Timetable)
+def invalidate_total_classes(sender, instance, **kwargs):
+    cache.delete(Timetable.total_classes_cache_key(instance.course_id))
+
+@receiver(pre_save, sender=Attendance)
+def remember_counted_pair(sender, instance, raw=False, **kwargs):
+    # An update may move the record to another student or course; both pairs need recounting
+    if raw or instance.pk is None:
+        return
+    instance._counted_pair = Attendance.objects.filter(pk=instance.pk).values_list('student_id', 'course_id').first()
+
+@receiver(post_save, sender=Attendance)
+def count_attendance(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    stats, _ = StudentCourseStats.objects.get_or_create(
+        student_id=instance.student_id,
+        course_id=instance.course_id
+    )
+    if created:
+        if instance.status == Attendance.Status.PRESENT:
+            StudentCourseStats.objects.filter(pk=stats.pk).update(attended=F('attended') + 1)
+        return
+    # Status may have changed
+    StudentCourseStats.objects.recount(pk=stats.pk)
+    previous_pair = getattr(instance, '_counted_pair', None)
+    if previous_pair and previous_pair != (instance.student_id, instance.course_id):
+        student_id, course_id = previous_pair
+        StudentCourseStats.objects.recount(student_id=student_id, course_id=course_id)
+
+@receiver(post_delete, sender=Attendance)
+def uncount_attendance(sender, instance, **kwargs):
+    StudentCourseStats.objects.recount(student_id=instance.student_id, course_id=instance.course_id)
@@ -1,3 +1,290 @@
-from django.test import TestCase
+import datetime
+import io
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from .models import User, Department, Course, LectureHall, Timetable, Attendance, StudentCourseStats
+from .serializers import TimetableSerializer, UserSerializer
+
+# Monday 09:00 UTC, inside the 08:00-10:00 slot created below
+NOW = datetime.datetime(2026, 10, 12, 9, 0, tzinfo=datetime.timezone.utc)
+HALL_LAT, HALL_LON = 6.5244, 3.3792
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AttendanceTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Computer Science', code='CSC')
+        cls.course = Course.objects.create(code='CSC201', title='Data Structures', department=cls.department, level=200)
+        cls.hall = LectureHall.objects.create(name='LT1', building='Science Block', latitude=HALL_LAT, longitude=HALL_LON, radius=100)
+        cls.lecturer = User.objects.create_user(
+            'lecturer@uni.edu', 'lecturer@uni.edu', 'password', user_type=User.UserType.LECTURER, department=cls.department
+        )
+        cls.lecturer.courses.add(cls.course)
+        cls.timetable = Timetable.objects.create(
+            course=cls.course, lecturer=cls.lecturer, day_of_week=Timetable.DayOfWeek.MONDAY,
+            start_time=datetime.time(8), end_time=datetime.time(10), lecture_hall=cls.hall, semester='1'
+        )
+        cls.student = cls.create_student('20/0001')
+
+    @classmethod
+    def create_student(cls, matric_number, **extra_fields):
+        extra_fields.setdefault('department', cls.department)
+        extra_fields.setdefault('level', 200)
+        return User.objects.create_user(
+            matric_number, None, 'password', user_type=User.UserType.STUDENT, matric_number=matric_number, **extra_fields
+        )
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('django.utils.timezone.now', return_value=NOW)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+
+
+class GeofenceTests(AttendanceTestCase):
+    def login(self, latitude, longitude):
+        return self.client.post('/api/auth/', {
+            'matric_number': self.student.matric_number,
+            'password': 'password',
+            'latitude': latitude,
+            'longitude': longitude
+        }, format='json')
+
+    def test_login_inside_hall(self):
+        response = self.login(HALL_LAT, HALL_LON)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('tokens', response.data)
+
+    def test_login_outside_hall(self):
+        response = self.login(HALL_LAT + 1, HALL_LON)
+        self.assertEqual(response.status_code, 403)
+
+    def test_distance_across_antimeridian(self):
+        hall = LectureHall(name='LT2', building='Dateline', latitude=0.0, longitude=179.9998, radius=100)
+        self.assertLess(hall.distance_to(0.0, -179.9998), 100)
+        far = hall.distance_to(1.0, 179.9998)
+        self.assertAlmostEqual(far, 111195, delta=1)
+
+    def test_login_outside_hall_reports_great_circle_distance(self):
+        response = self.login(HALL_LAT + 0.01, HALL_LON + 0.01)
+        self.assertEqual(response.status_code, 403)
+        self.assertAlmostEqual(response.data['distance'], self.hall.distance_to(HALL_LAT + 0.01, HALL_LON + 0.01))
+        self.assertGreater(response.data['distance'], 1.4 * 1110)
+
+    def test_hall_change_applies_immediately(self):
+        self.assertEqual(self.login(HALL_LAT, HALL_LON).status_code, 200)
+        self.hall.latitude = HALL_LAT + 1
+        self.hall.save()
+        self.assertEqual(self.login(HALL_LAT, HALL_LON).status_code, 403)
+
+    def test_course_change_applies_immediately(self):
+        self.assertEqual(self.login(HALL_LAT, HALL_LON).status_code, 200)
+        self.course.department = Department.objects.create(name='Mathematics', code='MTH')
+        self.course.save()
+        self.assertEqual(self.login(HALL_LAT, HALL_LON).status_code, 403)
+
+    def test_login_rejects_invalid_coordinates(self):
+        for latitude, longitude in [('nan', HALL_LON), (HALL_LAT, 'inf'), ('abc', HALL_LON), (None, HALL_LON), (91, HALL_LON), (HALL_LAT, 181)]:
+            with self.subTest(latitude=latitude, longitude=longitude):
+                response = self.login(latitude, longitude)
+                self.assertEqual(response.status_code, 400)
+                self.assertNotIn('tokens', response.data)
+
+    def test_mark_attendance_rejects_invalid_coordinates(self):
+        self.client.force_authenticate(self.student)
+        for latitude in ['nan', '-inf', 'abc', None]:
+            with self.subTest(latitude=latitude):
+                response = self.client.post('/api/attendance/mark_attendance/', {
+                    'latitude': latitude,
+                    'longitude': HALL_LON
+                }, format='json')
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Attendance.objects.exists())
+
+    def test_mark_attendance_inside_hall(self):
+        self.client.force_authenticate(self.student)
+        response = self.client.post('/api/attendance/mark_attendance/', {
+            'latitude': HALL_LAT,
+            'longitude': HALL_LON
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Attendance.objects.filter(student=self.student, timetable=self.timetable).exists())
+
+
+class StudentCourseStatsTests(AttendanceTestCase):
+    def attended(self, student, course=None):
+        return StudentCourseStats.objects.filter(
+            student=student,
+            course=course or self.course
+        ).values_list('attended', flat=True).first()
+
+    def mark(self, student, **extra_fields):
+        return Attendance.objects.create(student=student, course=self.course, timetable=self.timetable, **extra_fields)
+
+    def test_create_present(self):
+        self.mark(self.student)
+        self.assertEqual(self.attended(self.student), 1)
+
+    def test_create_absent(self):
+        self.mark(self.student, status=Attendance.Status.ABSENT)
+        self.assertEqual(self.attended(self.student), 0)
+
+    def test_status_update(self):
+        attendance = self.mark(self.student)
+        attendance.status = Attendance.Status.ABSENT
+        attendance.save()
+        self.assertEqual(self.attended(self.student), 0)
+
+    def test_update_moves_count_between_pairs(self):
+        other_student = self.create_student('20/0002')
+        other_course = Course.objects.create(code='CSC203', title='Algorithms', department=self.department, level=200)
+        attendance = self.mark(self.student)
+        attendance.student = other_student
+        attendance.course = other_course
+        attendance.save()
+        self.assertEqual(self.attended(self.student), 0)
+        self.assertEqual(self.attended(other_student, other_course), 1)
+
+    def test_delete(self):
+        attendance = self.mark(self.student)
+        attendance.delete()
+        self.assertEqual(self.attended(self.student), 0)
+
+    def test_void_via_validate_attendance(self):
+        # One of eleven students marked, under the 10% threshold
+        for i in range(2, 12):
+            self.create_student(f'20/{i:04d}')
+        self.mark(self.student)
+        self.client.force_authenticate(self.lecturer)
+        with mock.patch('django.utils.timezone.now', return_value=NOW.replace(hour=10, minute=30)):
+            response = self.client.post('/api/validate-attendance/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['voided_count'], 1)
+        self.assertEqual(self.attended(self.student), 0)
+
+    def test_bulk_mark_present(self):
+        other_student = self.create_student('20/0002')
+        self.mark(self.student)
+        Attendance.objects.bulk_mark_present(self.timetable, [self.student, other_student])
+        self.assertEqual(self.attended(self.student), 1)
+        self.assertEqual(self.attended(other_student), 1)
+
+    def test_rebuild(self):
+        self.mark(self.student)
+        # Stale counts in both directions
+        StudentCourseStats.objects.update(attended=5)
+        StudentCourseStats.objects.create(student=self.create_student('20/0002'), course=self.course, attended=3)
+        StudentCourseStats.objects.rebuild()
+        self.assertEqual(self.attended(self.student), 1)
+        self.assertEqual(StudentCourseStats.objects.get(student__matric_number='20/0002').attended, 0)
+
+
+class BulkMarkAttendanceTests(AttendanceTestCase):
+    def bulk_mark(self, user, timetable_id, student_ids):
+        self.client.force_authenticate(user)
+        return self.client.post('/api/attendance/bulk_mark_attendance/', {
+            'timetable_id': timetable_id,
+            'student_ids': student_ids
+        }, format='json')
+
+    def test_rejects_non_integer_input(self):
+        for timetable_id, student_ids in [('abc', [self.student.pk]), (self.timetable.pk, ['abc']), (None, [self.student.pk]), (self.timetable.pk, 'abc')]:
+            with self.subTest(timetable_id=timetable_id, student_ids=student_ids):
+                response = self.bulk_mark(self.lecturer, timetable_id, student_ids)
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Attendance.objects.exists())
+
+    def test_other_lecturers_timetable_is_not_found(self):
+        other_lecturer = User.objects.create_user(
+            'other@uni.edu', 'other@uni.edu', 'password', user_type=User.UserType.LECTURER, department=self.department
+        )
+        response = self.bulk_mark(other_lecturer, self.timetable.pk, [self.student.pk])
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Attendance.objects.exists())
+
+    def test_filters_students_outside_department_and_level(self):
+        other_level = self.create_student('20/0002', level=300)
+        other_department = self.create_student('20/0003', department=Department.objects.create(name='Mathematics', code='MTH'))
+        response = self.bulk_mark(self.lecturer, self.timetable.pk, [self.student.pk, other_level.pk, other_department.pk, self.lecturer.pk])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['submitted'], 1)
+        self.assertQuerySetEqual(Attendance.objects.values_list('student', flat=True), [self.student.pk])
+
+    def test_submitted_counts_only_new_records(self):
+        other_student = self.create_student('20/0002')
+        Attendance.objects.create(student=self.student, course=self.course, timetable=self.timetable)
+        response = self.bulk_mark(self.lecturer, self.timetable.pk, [self.student.pk, other_student.pk])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['submitted'], 1)
+        response = self.bulk_mark(self.lecturer, self.timetable.pk, [self.student.pk, other_student.pk])
+        self.assertEqual(response.data['submitted'], 0)
+
+    def test_repeat_call_is_idempotent(self):
+        other_student = self.create_student('20/0002')
+        student_ids = [self.student.pk, other_student.pk]
+        self.assertEqual(self.bulk_mark(self.lecturer, self.timetable.pk, student_ids).status_code, 201)
+        self.assertEqual(self.bulk_mark(self.lecturer, self.timetable.pk, student_ids).status_code, 201)
+        self.assertEqual(Attendance.objects.filter(timetable=self.timetable).count(), 2)
+        self.assertEqual(
+            sorted(StudentCourseStats.objects.values_list('attended', flat=True)),
+            [1, 1]
+        )
+
+
+class TimetableSerializerTests(AttendanceTestCase):
+    def test_is_active_now_without_annotation(self):
+        timetable = Timetable.objects.get(pk=self.timetable.pk)
+        self.assertTrue(TimetableSerializer(timetable).data['is_active_now'])
+        timetable.active = False
+        self.assertFalse(TimetableSerializer(timetable).data['is_active_now'])
+
+    def test_is_active_now_from_annotation(self):
+        with mock.patch('django.utils.timezone.now', return_value=NOW.replace(hour=11)):
+            timetable = Timetable.objects.with_active_flag().get(pk=self.timetable.pk)
+        self.assertFalse(TimetableSerializer(timetable).data['is_active_now'])
+
+
+class SignatureTests(AttendanceTestCase):
+    def test_rejects_invalid_payloads(self):
+        for signature in ['data:image/png;base64,@@@', 'data:image/png;base64,\u00e9\u00e9', 'not-a-data-uri']:
+            with self.subTest(signature=signature):
+                serializer = UserSerializer(data={
+                    'username': '20/0002',
+                    'password': 'password',
+                    'user_type': User.UserType.STUDENT,
+                    'matric_number': '20/0002',
+                    'digital_signature': signature
+                })
+                self.assertFalse(serializer.is_valid())
+                self.assertIn('digital_signature', serializer.errors)
+
+
+class ConvertStatusGenderTests(AttendanceTestCase):
+    def test_converts_letter_codes(self):
+        attendance = Attendance.objects.create(student=self.student, course=self.course, timetable=self.timetable)
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE app_attendance SET status = %s WHERE id = %s', ['V', attendance.pk])
+            cursor.execute('UPDATE app_user SET gender = %s WHERE id = %s', ['F', self.student.pk])
+        call_command('convert_status_gender', stdout=io.StringIO())
+        self.assertEqual(Attendance.objects.get(pk=attendance.pk).status, Attendance.Status.VOIDED)
+        self.assertEqual(User.objects.get(pk=self.student.pk).gender, User.Gender.FEMALE)
+        self.assertTrue(Attendance.objects.filter(status=Attendance.Status.VOIDED).exists())
+
+    def test_serializer_rejects_letter_gender(self):
+        serializer = UserSerializer(data={
+            'username': '20/0002',
+            'password': 'password',
+            'user_type': User.UserType.STUDENT,
+            'matric_number': '20/0002',
+            'gender': 'M'
+        })
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('gender', serializer.errors)
@@ -70,6 +70,21 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Reuse connections across requests instead of reconnecting every time
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Per-process memory cache: signal-based invalidation only clears the worker that
+# handled the write, so anything cached here must tolerate a short-TTL stale read
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
@@ -78,6 +93,7 @@ AUTH_USER_MODEL = 'app.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework_simplejwt.authentication.JWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -108,6 +124,12 @@ SPECTACULAR_SETTINGS = {
     - Time-bound attendance windows
     - Attendance validation (minimum 10% threshold)
     - Comprehensive reporting and exports
+    
+    ### Integer codes:
+    - Attendance `status`: 1 = Present, 2 = Absent, 3 = Voided
+    - User `gender`: 1 = Male, 2 = Female, 3 = Other
+    
+    The former letter codes (P/A/V, M/F/O) are no longer accepted; sending them returns 400.
     """,
     'VERSION': '1.0.0',
     'SERVE_INCLUDE_SCHEMA': False,
@@ -152,6 +174,15 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+PASSWORD_HASHERS = [
+    'app.hashers.TunedArgon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -169,6 +200,10 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_URL = 'media/'
+
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 